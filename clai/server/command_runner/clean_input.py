@@ -6,9 +6,8 @@
 #
 
 def extract_quoted_agent_name(plugin_to_select):
-    if plugin_to_select.startswith('"'):
-        names = plugin_to_select.split('"')[1::2]
-        if names:
-            return names[0]
+    if plugin_to_select[:1] != '"':
+        return plugin_to_select
 
-    return plugin_to_select
+    end = plugin_to_select.find('"', 1)
+    return plugin_to_select[1:end] if end != -1 else plugin_to_select[1:]
@@ -11,9 +11,9 @@ to calibrate the selector for CLAI skills
 """
 
 from typing import Optional, List, Union
+from itertools import chain
 from pathlib import Path
 
-import os
 import json
 import numpy as np
 
@@ -26,6 +26,65 @@ from clai.server.logger import current_logger as logger
 
 from . import warm_start_datagen
 
+_PACKAGE_DIR = Path(__file__).resolve().parent
+_CONFIG_FILEPATH = str(_PACKAGE_DIR / 'config.yml')
+_BANDIT_CONFIG_FILEPATH = str(_PACKAGE_DIR / 'bandit_config.json')
+
+_N_WARM_START_POINTS = 1000
+
+
+# pylint: disable=protected-access
+def _noop_setup(bandit):
+    profile = 'noop-always'
+    kwargs = {
+        'n_points': _N_WARM_START_POINTS,
+        'context_size': bandit._n_actions,
+        'noop_position': 0
+    }
+    return profile, kwargs
+
+
+def _ignore_skill_setup(bandit, skill_name):
+    bandit.__add_to_action_order__(skill_name)
+    profile = 'ignore-skill'
+    kwargs = {
+        'n_points': _N_WARM_START_POINTS,
+        'context_size': bandit._n_actions,
+        'skill_idx': bandit._action_order[skill_name]
+    }
+    return profile, kwargs
+
+
+def _max_orchestrator_setup(bandit):
+    profile = 'max-orchestrator'
+    kwargs = {
+        'n_points': _N_WARM_START_POINTS,
+        'context_size': bandit._n_actions
+    }
+    return profile, kwargs
+
+
+def _preferred_skill_orchestrator_setup(bandit, advantage_skill, disadvantage_skill):
+    bandit.__add_to_action_order__(advantage_skill)
+    bandit.__add_to_action_order__(disadvantage_skill)
+    profile = 'preferred-skill'
+    kwargs = {
+        'n_points': _N_WARM_START_POINTS,
+        'context_size': bandit._n_actions,
+        'advantage_skillidx': bandit._action_order[advantage_skill],
+        'disadvantage_skillidx': bandit._action_order[disadvantage_skill]
+    }
+    return profile, kwargs
+# pylint: enable=protected-access
+
+
+_WARM_START_METHODS = {
+    'noop': _noop_setup,
+    'ignore-skill': _ignore_skill_setup,
+    'max-orchestrator': _max_orchestrator_setup,
+    'preferred-skill': _preferred_skill_orchestrator_setup
+}
+
 
 # pylint: disable=too-many-arguments,unused-argument,too-many-instance-attributes
 class RLTKBandit(Orchestrator):
@@ -33,13 +92,15 @@ class RLTKBandit(Orchestrator):
     def __init__(self):
         super(RLTKBandit, self).__init__()
 
-        self._config_filepath = os.path.join(Path(__file__).parent.absolute(), 'config.yml')
-        self._bandit_config_filepath = os.path.join(Path(__file__).parent.absolute(), 'bandit_config.json')
+        self._config_filepath = _CONFIG_FILEPATH
+        self._bandit_config_filepath = _BANDIT_CONFIG_FILEPATH
 
         self._noop_confidence = None
         self._agent = None
         self._n_actions = None
         self._action_order = None
+        self._idx_to_agent = None
+        self._max_action_order = None
         self._warm_start = None
         self._warm_start_type = None
         self._warm_start_kwargs = None
@@ -47,7 +108,8 @@ class RLTKBandit(Orchestrator):
 
         self.load_bandit_state()
         self.load_state()
-        self.warm_start_orchestrator()
+        if self._warm_start:
+            self.warm_start_orchestrator()
 
     def load_bandit_state(self):
 
@@ -81,6 +143,8 @@ class RLTKBandit(Orchestrator):
         self._action_order = state.get('action_order', None)
         if self._action_order is None:
             self._action_order = default_action_order
+        self._idx_to_agent = {v: k for k, v in self._action_order.items()}
+        self._max_action_order = max(self._action_order.values())
 
         self._n_actions = self._agent.num_actions
         self._warm_start = state.get('warm_start', self._warm_start)
@@ -88,58 +152,16 @@ class RLTKBandit(Orchestrator):
     def warm_start_orchestrator(self):
         """
         Warm starts the orchestrator (pre-trains the weights) to suit a
-        particular profile
+        particular profile. Does nothing if the persisted state shows the
+        orchestrator has already been warm-started
         """
 
-        def noop_setup():
-            profile = 'noop-always'
-            kwargs = {
-                'n_points': 1000,
-                'context_size': self._n_actions,
-                'noop_position': 0
-            }
-            return profile, kwargs
-
-        def ignore_skill_setup(skill_name):
-            self.__add_to_action_order__(skill_name)
-            profile = 'ignore-skill'
-            kwargs = {
-                'n_points': 1000,
-                'context_size': self._n_actions,
-                'skill_idx': self._action_order[skill_name]
-            }
-            return profile, kwargs
-
-        def max_orchestrator_setup():
-            profile = 'max-orchestrator'
-            kwargs = {
-                'n_points': 1000,
-                'context_size': self._n_actions
-            }
-            return profile, kwargs
-
-        def preferred_skill_orchestrator_setup(advantage_skill, disadvantage_skill):
-            self.__add_to_action_order__(advantage_skill)
-            self.__add_to_action_order__(disadvantage_skill)
-            profile = 'preferred-skill'
-            kwargs = {
-                'n_points': 1000,
-                'context_size': self._n_actions,
-                'advantage_skillidx': self._action_order[advantage_skill],
-                'disadvantage_skillidx': self._action_order[disadvantage_skill]
-            }
-            return profile, kwargs
+        if not self._warm_start:
+            return
 
         try:
-            warm_start_methods = {
-                'noop': noop_setup,
-                'ignore-skill': ignore_skill_setup,
-                'max-orchestrator': max_orchestrator_setup,
-                'preferred-skill': preferred_skill_orchestrator_setup
-            }
-
-            method = warm_start_methods[self._warm_start_type.lower()]
-            profile, kwargs = method(**self._warm_start_kwargs)
+            method = _WARM_START_METHODS[self._warm_start_type.lower()]
+            profile, kwargs = method(self, **self._warm_start_kwargs)
 
             tids, contexts, arm_rewards = warm_start_datagen.get_warmstart_data(
                 profile, **kwargs
@@ -162,8 +184,12 @@ class RLTKBandit(Orchestrator):
         if not candidate_actions:
             return None
 
-        if isinstance(candidate_actions, Action):
-            candidate_actions = [candidate_actions]
+        # skills may return several actions each; flatten them once so the
+        # rest of the bandit only ever deals with a flat List[Action]
+        candidate_actions = list(chain.from_iterable(
+            action if isinstance(action, list) else (action,)
+            for action in candidate_actions
+        ))
 
         context = self.__build_context__(candidate_actions)
         action_idx = self._agent.choose(t_id=command.command_id,
@@ -176,42 +202,41 @@ class RLTKBandit(Orchestrator):
 
         return suggested_action
 
-    def __build_context__(self,
-                          candidate_actions: Optional[List[Union[Action, List[Action]]]]
-                          ) -> np.array:
+    def __build_context__(self, candidate_actions: List[Action]) -> np.ndarray:
 
-        context = [0.0] * self._n_actions
+        context = np.zeros(self._n_actions, dtype=np.float64)
 
         noop_pos = self._action_order[self.noop_command]
         context[noop_pos] = self._noop_confidence
 
-        for action in candidate_actions:
-
+        idxs = np.empty(len(candidate_actions), dtype=np.intp)
+        for i, action in enumerate(candidate_actions):
             self.__add_to_action_order__(action.agent_owner)
+            idxs[i] = self._action_order[action.agent_owner]
+
+        context[idxs] = self._confidences_vectorized(candidate_actions)
 
-            pos = self._action_order[action.agent_owner]
-            conf = self.__calculate_confidence__(action)
-            context[pos] = conf
+        return context
 
-        return np.array(context, dtype=np.float)
+    @staticmethod
+    def _confidences_vectorized(candidate_actions: List[Action]) -> np.ndarray:
+        return np.fromiter((action.confidence for action in candidate_actions),
+                           dtype=np.float64, count=len(candidate_actions))
 
     def __add_to_action_order__(self, agent_name):
 
         if agent_name in self._action_order:
             return
 
-        max_action_order = max(self._action_order.values())
-        self._action_order[agent_name] = max_action_order + 1
+        self._max_action_order += 1
+        self._action_order[agent_name] = self._max_action_order
+        self._idx_to_agent[self._max_action_order] = agent_name
 
     def __choose_action__(self,
                           action_idx: int,
-                          candidate_actions: Optional[List[Union[Action, List[Action]]]]):
+                          candidate_actions: List[Action]):
 
-        suggested_agent = None
-        for agent_name, agent_idx in self._action_order.items():
-            if agent_idx == action_idx:
-                suggested_agent = agent_name
-                break
+        suggested_agent = self._idx_to_agent.get(action_idx)
 
         if suggested_agent == self.noop_command or suggested_agent is None:
             return None